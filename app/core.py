@@ -1,15 +1,34 @@
 # core.py
 from __future__ import annotations
 
+import warnings
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
 from typing import Literal
 
 from pydantic import BaseModel, Field, field_validator
 
-from app.utility import html_escape, render_template_file, json_pretty
+from app.utility import html_escape, load_template_text, render_template_text, json_pretty
 
 ALLOWED_SECTIONS = {"summary", "experience", "skills", "projects", "other"}
 
+SECTION_ALIASES = {
+    "education": "other",
+    "certifications": "skills",
+    "certification": "skills",
+    "training": "skills",
+    "courses": "skills",
+    "course": "skills",
+    "projects": "projects",
+    "project": "projects",
+    "work experience": "experience",
+    "experience": "experience",
+    "skills": "skills",
+    "summary": "summary",
+    "about": "summary",
+}
+
 
 # -------------------------
 # Pydantic models (domain)
@@ -38,23 +57,7 @@ class SuggestionItem(BaseModel):
         if not isinstance(v, str):
             return "other"
         s = v.strip().lower()
-
-        mapping = {
-            "education": "other",
-            "certifications": "skills",
-            "certification": "skills",
-            "training": "skills",
-            "courses": "skills",
-            "course": "skills",
-            "projects": "projects",
-            "project": "projects",
-            "work experience": "experience",
-            "experience": "experience",
-            "skills": "skills",
-            "summary": "summary",
-            "about": "summary",
-        }
-        s = mapping.get(s, s)
+        s = SECTION_ALIASES.get(s, s)
         return s if s in ALLOWED_SECTIONS else "other"
 
 
@@ -100,57 +103,85 @@ CRITICAL_KEYWORDS = {
     "ci/cd",
 }
 
-def decide_ui(report: FitReport) -> dict:
-    fit_score = int(report.fit_score)
+IMPACT_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+_DECISION_YES = dict(
+    code="YES",
+    badge="yes",
+    label="✅ Worth applying",
+    reason="Strong alignment with key requirements; remaining gaps are not blocking.",
+    next_step="Apply and tailor your CV and LinkedIn profile to highlight your strengths.",
+)
+_DECISION_MAYBE_HIGH = dict(
+    code="MAYBE",
+    badge="maybe",
+    label="⚠️ Worth applying only if highly motivated",
+    reason="Strong score, but there are gaps that could affect screening. Clarify them with concrete evidence or projects.",
+    next_step="Apply only if you can clearly demonstrate or mitigate the highlighted gaps (examples, portfolio, interview framing).",
+)
+_DECISION_MAYBE_MID = dict(
+    code="MAYBE",
+    badge="maybe",
+    label="⚠️ Worth applying only if highly motivated",
+    reason="Decent alignment, but concrete evidence is needed to pass initial screening.",
+    next_step="Apply only if you can clearly demonstrate the missing skills with real examples or projects.",
+)
+_DECISION_NO = dict(
+    code="NO",
+    badge="no",
+    label="❌ Not worth applying (for now)",
+    reason="Fit currently low.",
+    next_step="Focus on better-aligned roles or build targeted projects before applying.",
+)
+_DECISION_NO_MISSING_MUST = {
+    **_DECISION_NO,
+    "reason": "Some key requirements appear missing, with a high risk of early screening rejection.",
+}
+_DECISION_NO_HIGH_GAP = {
+    **_DECISION_NO,
+    "reason": "There are high-impact gaps that likely block the role for now.",
+}
+
+
+def _score_bucket(fit_score: int) -> str:
+    if fit_score >= 75:
+        return "high"
+    if fit_score >= 55:
+        return "mid"
+    return "low"
+
+
+def _compute_flags(report: FitReport) -> tuple[str, bool, bool]:
     must = report.must_have_match or []
     gaps = report.gaps or []
 
-    missing_must = [m for m in must if m.status == "missing"]
-    has_missing_must = len(missing_must) > 0
+    has_missing_must = any(m.status == "missing" for m in must)
     has_high_gap = any(g.impact == "high" for g in gaps)
+    return _score_bucket(int(report.fit_score)), has_missing_must, has_high_gap
+
 
+@lru_cache(maxsize=None)
+def _decision(score_bucket: str, has_missing_must: bool, has_high_gap: bool) -> dict:
     # Non far ribaltare un punteggio alto: i high gaps al massimo portano a MAYBE.
-    if fit_score >= 75:
+    if score_bucket == "high":
         if has_missing_must or has_high_gap:
-            return dict(
-                code="MAYBE",
-                badge="maybe",
-                label="⚠️ Worth applying only if highly motivated",
-                reason="Strong score, but there are gaps that could affect screening. Clarify them with concrete evidence or projects.",
-                next_step="Apply only if you can clearly demonstrate or mitigate the highlighted gaps (examples, portfolio, interview framing).",
-            )
-        return dict(
-            code="YES",
-            badge="yes",
-            label="✅ Worth applying",
-            reason="Strong alignment with key requirements; remaining gaps are not blocking.",
-            next_step="Apply and tailor your CV and LinkedIn profile to highlight your strengths.",
-        )
+            return _DECISION_MAYBE_HIGH
+        return _DECISION_YES
 
     # Fascia intermedia
-    if fit_score >= 55:
-        return dict(
-            code="MAYBE",
-            badge="maybe",
-            label="⚠️ Worth applying only if highly motivated",
-            reason="Decent alignment, but concrete evidence is needed to pass initial screening.",
-            next_step="Apply only if you can clearly demonstrate the missing skills with real examples or projects.",
-        )
+    if score_bucket == "mid":
+        return _DECISION_MAYBE_MID
 
     # Fascia bassa
-    reason = "Fit currently low."
     if has_missing_must:
-        reason = "Some key requirements appear missing, with a high risk of early screening rejection."
-    elif has_high_gap:
-        reason = "There are high-impact gaps that likely block the role for now."
-
-    return dict(
-        code="NO",
-        badge="no",
-        label="❌ Not worth applying (for now)",
-        reason=reason,
-        next_step="Focus on better-aligned roles or build targeted projects before applying.",
-    )
+        return _DECISION_NO_MISSING_MUST
+    if has_high_gap:
+        return _DECISION_NO_HIGH_GAP
+    return _DECISION_NO
+
+
+def decide_ui(report: FitReport) -> dict:
+    return dict(_decision(*_compute_flags(report)))
 
 
 
@@ -168,21 +199,56 @@ def _card(text: str, kind: str) -> str:
 # -------------------------
 # HTML report rendering
 # -------------------------
-def render_report_html(report: FitReport, json_path: str, template_path: str, job_title: str = "") -> str:
+# Valori già sicuri (costanti, numeri, uuid), HTML già costruito o JSON già
+# neutralizzato per <script>: niente escape
+_SAFE_KEYS = {
+    "decision_badge",
+    "decision_code",
+    "fit_score",
+    "confidence",
+    "score_bar_class",
+    "strengths_count",
+    "blockers_count",
+    "job_id",
+    "json_dump",
+    "strengths_cards",
+    "blockers_cards",
+}
+
+
+def render_report_html(
+    report: FitReport,
+    json_path: str,
+    template_path: str | None = None,
+    job_title: str = "",
+    *,
+    template_text: str | None = None,
+) -> str:
+    if template_text is None:
+        if template_path is None:
+            raise ValueError("render_report_html requires template_text (or template_path)")
+        warnings.warn(
+            "render_report_html(template_path=...) is deprecated, pass template_text instead",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        template_text = load_template_text(template_path)
+
     d = decide_ui(report)
 
     must = report.must_have_match or []
     nice = report.nice_to_have_match or []
 
-    strengths = (
-        [m.requirement for m in must + nice if m.status == "match"] +
-        [m.requirement for m in must + nice if m.status == "partial"]
-    )[:3]
+    matches: list[str] = []
+    partials: list[str] = []
+    for m in chain(must, nice):
+        if m.status == "match":
+            matches.append(m.requirement)
+        elif m.status == "partial":
+            partials.append(m.requirement)
+    strengths = (matches + partials)[:3]
 
-    gaps_sorted = sorted(
-        report.gaps or [],
-        key=lambda g: {"high": 0, "medium": 1, "low": 2}.get(g.impact, 3)
-    )
+    gaps_sorted = sorted(report.gaps or [], key=lambda g: IMPACT_ORDER.get(g.impact, 3))
     blockers = [g.gap for g in gaps_sorted if g.impact in ("high", "medium")][:3]
 
     if not blockers:
@@ -201,25 +267,27 @@ def render_report_html(report: FitReport, json_path: str, template_path: str, jo
     else:
         score_bar_class = "bar-green"
 
-    values = {
-        "json_file_name": html_escape(Path(json_path).name),
-        "decision_label": html_escape(d["label"]),
-        "decision_reason": html_escape(d["reason"]),
-        "decision_badge": html_escape(d["badge"]),
-        "decision_code": html_escape(d["code"]),
-        "fit_score": html_escape(str(score)),
-        "confidence": html_escape(str(report.confidence)),
-        "next_step": html_escape(d["next_step"]),
-        "summary": html_escape(report.summary),
-        "final_note": html_escape(report.final_note),
-        "json_dump": html_escape(json_pretty(report.model_dump())),
-        "job_title": html_escape(job_title or "Posizione LinkedIn"),
+    raw = {
+        "json_file_name": Path(json_path).name,
+        "decision_label": d["label"],
+        "decision_reason": d["reason"],
+        "decision_badge": d["badge"],
+        "decision_code": d["code"],
+        "fit_score": str(score),
+        "confidence": str(report.confidence),
+        "next_step": d["next_step"],
+        "summary": report.summary,
+        "final_note": report.final_note,
+        # dentro <script type="application/json">: basta neutralizzare "<" (</script>, <!--)
+        "json_dump": json_pretty(report.model_dump(mode="json")).replace("<", "\\u003c"),
+        "job_title": job_title or "Posizione LinkedIn",
         "score_bar_class": score_bar_class,
-        "job_id": html_escape(Path(json_path).parent.name),
+        "job_id": Path(json_path).parent.name,
         "strengths_cards": strengths_cards,
         "blockers_cards": blockers_cards,
-        "strengths_count": html_escape(f"{min(len(strengths),3)}/3"),
-        "blockers_count": html_escape(f"{min(len(blockers),3)}/3"),
+        "strengths_count": f"{min(len(strengths),3)}/3",
+        "blockers_count": f"{min(len(blockers),3)}/3",
     }
+    values = {k: (v if k in _SAFE_KEYS else html_escape(v)) for k, v in raw.items()}
 
-    return render_template_file(template_path, values)
+    return render_template_text(template_text, values)
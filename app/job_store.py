@@ -0,0 +1,78 @@
+# job_store.py
+from __future__ import annotations
+
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from app.utility import json_dumps, json_loads
+
+load_dotenv()
+
+# Se REDIS_URL è impostato: stato condiviso tra web e worker (arq).
+# Altrimenti: stato in memoria, limitato dal TTL (sviluppo locale).
+REDIS_URL = os.getenv("REDIS_URL", "").strip() or None
+JOB_TTL_SECONDS = 86400
+
+_redis = None
+# ordinato per scadenza: ogni scrittura sposta la chiave in fondo (TTL fisso)
+_memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+
+def _key(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+def _get_redis():
+    global _redis
+    if _redis is None:
+        import redis.asyncio as aioredis
+
+        _redis = aioredis.from_url(REDIS_URL)
+    return _redis
+
+
+def _evict_expired(now: float) -> None:
+    # si ferma alla prima voce ancora valida
+    while _memory:
+        exp, _ = next(iter(_memory.values()))
+        if exp > now:
+            break
+        _memory.popitem(last=False)
+
+
+async def set_status(job_id: str, status: str, error: str | None = None, **extra) -> None:
+    data = {"status": status, "error": error, **extra}
+    if REDIS_URL:
+        await _get_redis().setex(_key(job_id), JOB_TTL_SECONDS, json_dumps(data))
+        return
+
+    now = time.monotonic()
+    _evict_expired(now)
+    _memory[job_id] = (now + JOB_TTL_SECONDS, data)
+    _memory.move_to_end(job_id)
+
+
+async def get_status(job_id: str) -> Optional[dict]:
+    if REDIS_URL:
+        raw = await _get_redis().get(_key(job_id))
+        return json_loads(raw) if raw else None
+
+    entry = _memory.get(job_id)
+    if not entry:
+        return None
+    exp, data = entry
+    if exp <= time.monotonic():
+        _memory.pop(job_id, None)
+        return None
+    return data
+
+
+async def close() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
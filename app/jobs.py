@@ -0,0 +1,63 @@
+# jobs.py
+# Job di analisi: condiviso tra webapp (BackgroundTasks) e worker arq.
+from __future__ import annotations
+
+import asyncio
+from functools import lru_cache
+from pathlib import Path
+
+from app.job_store import set_status
+from app.utility import compile_prompt, read_text_mmap
+from app.web_helpers import save_text_input, process_job
+
+APP_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = APP_DIR.parent
+
+TEMPLATES_DIR = APP_DIR / "templates"
+PROMPTS_DIR = APP_DIR / "prompts"
+
+
+@lru_cache(maxsize=32)
+def load_prompt_md(filename: str) -> str:
+    path = PROMPTS_DIR / filename
+    if not path.exists():
+        raise FileNotFoundError(f"Prompt file missing: {path}")
+    return path.read_text(encoding="utf-8").strip()
+
+
+SYSTEM_PROMPT_CORE = load_prompt_md("hr_fit_core_system.md")
+USER_TEMPLATE_CORE = compile_prompt(load_prompt_md("hr_fit_core_user.md"))
+
+SYSTEM_PROMPT_SUGG = load_prompt_md("hr_fit_suggestions_system.md")
+USER_TEMPLATE_SUGG = compile_prompt(load_prompt_md("hr_fit_suggestions_user.md"))
+
+# letto una volta (mmap) e condiviso da tutti i render del report
+REPORT_TEMPLATE = read_text_mmap(TEMPLATES_DIR / "report.html")
+
+
+async def run_job(job_id: str, cv_txt: str, job_txt: str, job_title: str) -> None:
+    try:
+        await set_status(job_id, "RUNNING")
+
+        paths = await process_job(
+            app_root=PROJECT_ROOT,
+            templates_dir=TEMPLATES_DIR,
+            job_id=job_id,
+            system_prompt_core=SYSTEM_PROMPT_CORE,
+            user_template_core=USER_TEMPLATE_CORE,
+            system_prompt_sugg=SYSTEM_PROMPT_SUGG,
+            user_template_sugg=USER_TEMPLATE_SUGG,
+            cv_txt=cv_txt,
+            job_txt=job_txt,
+            job_title=job_title,
+            template_text=REPORT_TEMPLATE,
+        )
+
+        await set_status(job_id, "DONE", None, **paths)
+    except Exception as e:
+        # salva sempre l'errore su disco, così non lo perdi
+        try:
+            await asyncio.to_thread(save_text_input, PROJECT_ROOT, job_id, "error.txt", str(e))
+        except Exception:
+            pass
+        await set_status(job_id, "ERROR", str(e))
@@ -2,15 +2,45 @@
 from __future__ import annotations
 
 import io
+import logging
+import mmap
+import os
 import re
-import json
+import shutil
+import tempfile
+import threading
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Callable, Optional
 
-import requests
+import httpx
 from bs4 import BeautifulSoup
 from pypdf import PdfReader
 
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # fallback: pypdf
+    pdfium = None
+
+try:
+    import orjson
+except ImportError:  # fallback: stdlib json
+    orjson = None
+    import json
+
+
+logger = logging.getLogger(__name__)
+
+_PDFIUM_LOCK = threading.Lock()
+
+_RE_TRAIL_WS = re.compile(r"[ \t]+\n")
+_RE_MULTI_NL = re.compile(r"\n{3,}")
+_RE_MULTI_SP = re.compile(r"\s{2,}")
+_RE_SPACED_PAIR = re.compile(r"[A-Za-zÀ-ÖØ-öø-ÿ0-9]\s+[A-Za-zÀ-ÖØ-öø-ÿ0-9]")
+_RE_SPACED_COLLAPSE = re.compile(r"([A-Za-zÀ-ÖØ-öø-ÿ0-9])\s+(?=[A-Za-zÀ-ÖØ-öø-ÿ0-9])")
+_SPACED_PAIR_THRESHOLD = 25
+
 
 # -------------------------
 # File / Text helpers
@@ -19,16 +49,35 @@ def read_text(path: str | Path) -> str:
     return Path(path).read_text(encoding="utf-8", errors="ignore").strip()
 
 
-def write_text(path: str | Path, content: str) -> None:
-    Path(path).parent.mkdir(parents=True, exist_ok=True)
-    Path(path).write_text(content or "", encoding="utf-8")
+def ensure_dir(path: Path) -> Path:
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def write_text(path: str | Path, content: str | bytes) -> None:
+    path = Path(path)
+    data = content.encode("utf-8") if isinstance(content, str) else (content or b"")
+
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    try:
+        fd = os.open(path, flags, 0o644)
+    except FileNotFoundError:
+        # cartella mancante (mai creata o rimossa nel frattempo): crea e riprova
+        os.makedirs(path.parent, exist_ok=True)
+        fd = os.open(path, flags, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
 
 
 def sanitize_whitespace(text: str) -> str:
     text = text or ""
     text = text.replace("\r\n", "\n").replace("\r", "\n")
-    text = re.sub(r"[ \t]+\n", "\n", text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = _RE_TRAIL_WS.sub("\n", text)
+    text = _RE_MULTI_NL.sub("\n\n", text)
     return text.strip()
 
 def remove_show_more_less(text: str) -> str:
@@ -52,21 +101,84 @@ def clamp_chars(text: str, max_chars: int) -> str:
 # -------------------------
 # PDF -> text
 # -------------------------
-def pdf_bytes_to_text(data: bytes) -> str:
-    reader = PdfReader(io.BytesIO(data))
+def _pdfium_to_text(path: str) -> str:
+    # PDFium non è thread-safe (nemmeno su documenti diversi): una chiamata alla volta
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            parts: list[str] = []
+            for page in pdf:
+                textpage = page.get_textpage()
+                parts.append(textpage.get_text_range() or "")
+                textpage.close()
+                page.close()
+            return "\n".join(parts)
+        finally:
+            pdf.close()
+
+
+def _pypdf_to_text(path: str) -> str:
+    reader = PdfReader(path)
     parts: list[str] = []
     for page in reader.pages:
         parts.append(page.extract_text() or "")
-    return sanitize_whitespace("\n".join(parts))
+    return "\n".join(parts)
+
+
+def _pdf_to_text(path: str) -> str:
+    if pdfium is not None:
+        try:
+            return sanitize_whitespace(_pdfium_to_text(path))
+        except Exception:
+            # PDF rifiutato da PDFium: riprova con pypdf
+            logger.warning("PDFium text extraction failed, falling back to pypdf", exc_info=True)
+    return sanitize_whitespace(_pypdf_to_text(path))
+
+
+def pdf_stream_to_text(stream: BinaryIO) -> Optional[str]:
+    """
+    Copia lo stream su un file temporaneo e lo passa per path ai parser PDF,
+    senza caricare tutto il file in memoria. None se lo stream è vuoto.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as tmp:
+        shutil.copyfileobj(stream, tmp)
+        if tmp.tell() == 0:
+            return None
+        tmp.flush()
+        return _pdf_to_text(tmp.name)
+
+
+def text_stream_to_text(stream: BinaryIO) -> Optional[str]:
+    reader = io.TextIOWrapper(stream, encoding="utf-8", errors="ignore")
+    try:
+        chunks: list[str] = []
+        while chunk := reader.read(64 * 1024):
+            chunks.append(chunk)
+    finally:
+        reader.detach()  # non chiudere lo stream dell'upload
+    if not chunks:
+        return None
+    return sanitize_whitespace("".join(chunks))
 
 
 # -------------------------
 # HTML Fetch + LinkedIn job extraction (best-effort)
 # -------------------------
-def fetch_html(url: str, timeout: int = 20) -> str:
-    r = requests.get(url, timeout=timeout, headers={"User-Agent": "Mozilla/5.0"})
+def build_http_client(timeout: int = 20) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=timeout,
+        headers={"User-Agent": "Mozilla/5.0"},
+        http2=True,
+        follow_redirects=True,
+        limits=httpx.Limits(max_keepalive_connections=32),
+    )
+
+
+async def fetch_html(client: httpx.AsyncClient, url: str) -> str:
+    r = await client.get(url)
     r.raise_for_status()
-    return r.text
+    # LinkedIn risponde sempre in UTF-8: niente rilevamento dell'encoding
+    return r.content.decode("utf-8", errors="replace")
 
 
 def looks_like_authwall(html: str) -> bool:
@@ -93,8 +205,13 @@ def looks_like_authwall(html: str) -> bool:
 
 
 
-def extract_job_text_from_linkedin_html(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
+def parse_html(html: str) -> BeautifulSoup:
+    # lxml: parser C, molto più veloce di html.parser sulle pagine LinkedIn
+    return BeautifulSoup(html, "lxml")
+
+
+def extract_job_text_from_linkedin_html(html: str | BeautifulSoup) -> str:
+    soup = html if isinstance(html, BeautifulSoup) else parse_html(html)
 
     main = soup.select_one("main#main-content") or soup
 
@@ -112,8 +229,8 @@ def extract_job_text_from_linkedin_html(html: str) -> str:
     text = remove_show_more_less(text)
     return sanitize_whitespace(text)
 
-def extract_linkedin_job_title(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
+def extract_linkedin_job_title(html: str | BeautifulSoup) -> str:
+    soup = html if isinstance(html, BeautifulSoup) else parse_html(html)
     h1 = soup.select_one("h1.top-card-layout__title") or soup.select_one("h1")
     title = h1.get_text(" ", strip=True) if h1 else ""
     return sanitize_whitespace(title)
@@ -124,27 +241,124 @@ def extract_linkedin_job_title(html: str) -> str:
 # -------------------------
 # HTML template rendering
 # -------------------------
+_HTML_ESCAPE_TABLE = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#39;",
+})
+
+
+_HTML_UNSAFE = frozenset("&<>\"'")
+
+
 def html_escape(s: str) -> str:
     s = s or ""
-    return (
-        s.replace("&", "&amp;")
-         .replace("<", "&lt;")
-         .replace(">", "&gt;")
-         .replace('"', "&quot;")
-         .replace("'", "&#39;")
-    )
+    # stringhe già sicure (caso comune): nessuna nuova allocazione
+    if _HTML_UNSAFE.isdisjoint(s):
+        return s
+    return s.translate(_HTML_ESCAPE_TABLE)
+
+
+
+_RE_PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+_RE_PROMPT_FIELD = re.compile(r"\{(\w+)\}")
+
 
+def _split_template(tpl: str, pattern: re.Pattern[str]) -> tuple[list[str], list[str], str]:
+    # Split una sola volta: [literal, key, literal, key, ..., literal]
+    literals: list[str] = []
+    keys: list[str] = []
+    pos = 0
+    for m in pattern.finditer(tpl):
+        literals.append(tpl[pos:m.start()])
+        keys.append(m.group(1))
+        pos = m.end()
+    return literals, keys, tpl[pos:]
 
 
-def render_template_file(template_path: str | Path, values: dict[str, str]) -> str:
-    tpl = Path(template_path).read_text(encoding="utf-8")
-    for k, v in values.items():
-        tpl = tpl.replace("{{" + k + "}}", v)
-    return tpl
+def read_text_mmap(path: str | Path) -> str:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[:].decode("utf-8")
+
+
+# Una sola voce per path: se il template cambia su disco (mtime) viene sostituita
+_TEMPLATE_CACHE: dict[str, tuple[float, str]] = {}
+
+
+def load_template_text(template_path: str | Path) -> str:
+    path = str(template_path)
+    mtime = os.path.getmtime(path)
+    cached = _TEMPLATE_CACHE.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    text = read_text_mmap(path)
+    _TEMPLATE_CACHE[path] = (mtime, text)
+    return text
+
+
+@lru_cache(maxsize=8)
+def compile_template_text(tpl: str) -> Callable[[dict[str, str]], str]:
+    literals, keys, tail = _split_template(tpl, _RE_PLACEHOLDER)
+
+    def render(values: dict[str, str]) -> str:
+        parts: list[str] = []
+        for lit, k in zip(literals, keys):
+            parts.append(lit)
+            parts.append(values.get(k, ""))
+        parts.append(tail)
+        return "".join(parts)
+
+    return render
+
+
+def compile_prompt(tpl: str) -> Callable[..., str]:
+    """
+    Precompila un prompt con campi {name}: sostituzione in un solo passaggio.
+    Le altre graffe (es. esempi JSON) restano invariate, a differenza di str.format.
+    """
+    literals, keys, tail = _split_template(tpl, _RE_PROMPT_FIELD)
+
+    def render(**values: str) -> str:
+        parts: list[str] = []
+        for lit, k in zip(literals, keys):
+            parts.append(lit)
+            parts.append(values[k])
+        parts.append(tail)
+        return "".join(parts)
+
+    return render
+
+
+def render_template_text(tpl: str, values: dict[str, str]) -> str:
+    return compile_template_text(tpl)(values)
+
+
+def json_pretty_bytes(obj: object) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
 
 
 def json_pretty(obj: object) -> str:
-    return json.dumps(obj, ensure_ascii=False, indent=2)
+    return json_pretty_bytes(obj).decode("utf-8")
+
+
+def json_dumps(obj: object) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def json_loads(text: str | bytes) -> object:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
 
 
 def normalize_spaced_text(text: str) -> str:
@@ -154,15 +368,16 @@ def normalize_spaced_text(text: str) -> str:
 
     # Heuristica: se troviamo abbastanza pattern lettera-spazio-lettera
     # allora è quasi certamente testo spaziato.
-    pairs = re.findall(r"[A-Za-zÀ-ÖØ-öø-ÿ0-9]\s+[A-Za-zÀ-ÖØ-öø-ÿ0-9]", text)
-    if len(pairs) < 25:
+    # Basta contare fino alla soglia: inutile scandire (e allocare) tutto il testo.
+    pairs = sum(1 for _ in islice(_RE_SPACED_PAIR.finditer(text), _SPACED_PAIR_THRESHOLD))
+    if pairs < _SPACED_PAIR_THRESHOLD:
         # testo normale: facciamo solo pulizia spazi multipli
-        return re.sub(r"\s{2,}", " ", text).strip()
+        return _RE_MULTI_SP.sub(" ", text).strip()
 
     # Collassa sequenze lettera-spazio-lettera
-    text = re.sub(r"([A-Za-zÀ-ÖØ-öø-ÿ0-9])\s+(?=[A-Za-zÀ-ÖØ-öø-ÿ0-9])", r"\1", text)
+    text = _RE_SPACED_COLLAPSE.sub(r"\1", text)
 
     # Ripulisci spazi multipli dopo il collasso
-    text = re.sub(r"\s{2,}", " ", text).strip()
+    text = _RE_MULTI_SP.sub(" ", text).strip()
     return text
 
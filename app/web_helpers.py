@@ -1,12 +1,13 @@
 # web_helpers.py
 from __future__ import annotations
 
+import asyncio
 import os
-import json
 import re
 import uuid
 from pathlib import Path
-from typing import Optional, Literal
+from functools import lru_cache
+from typing import Callable, Optional, Literal
 
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
@@ -22,10 +23,20 @@ from app.core import (
     ATSKeywordItem,
     render_report_html,
 )
-from app.utility import write_text, json_pretty, normalize_spaced_text
+from app.utility import (
+    ensure_dir,
+    write_text,
+    json_pretty,
+    json_pretty_bytes,
+    json_loads,
+    normalize_spaced_text,
+    load_template_text,
+)
 
 load_dotenv()
 
+_RE_TRAIL_COMMA = re.compile(r",\s*([}\]])")
+
 
 # -------------------------
 # Job paths helpers
@@ -34,11 +45,6 @@ def new_job_id() -> str:
     return uuid.uuid4().hex
 
 
-def ensure_dir(path: Path) -> Path:
-    path.mkdir(parents=True, exist_ok=True)
-    return path
-
-
 def job_dir(project_root: Path, job_id: str) -> Path:
     return ensure_dir(project_root / "jobs" / job_id)
 
@@ -48,7 +54,8 @@ def out_dir(project_root: Path, job_id: str) -> Path:
 
 
 def save_text_input(project_root: Path, job_id: str, filename: str, content: str) -> Path:
-    path = job_dir(project_root, job_id) / filename
+    # niente mkdir per ogni file: write_text crea la cartella solo se manca
+    path = project_root / "jobs" / job_id / filename
     write_text(path, content)
     return path
 
@@ -56,6 +63,7 @@ def save_text_input(project_root: Path, job_id: str, filename: str, content: str
 # -------------------------
 # LLM client
 # -------------------------
+@lru_cache(maxsize=1)
 def build_client() -> OpenAIClient:
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
@@ -74,9 +82,52 @@ def build_client() -> OpenAIClient:
     )
 
 
+async def invoke_llm(client: OpenAIClient, **kwargs):
+    # Chiamata async nativa se il client la espone, altrimenti thread separato
+    a_invoke = getattr(client, "a_invoke", None)
+    if a_invoke is not None:
+        return await a_invoke(**kwargs)
+    return await asyncio.to_thread(client.invoke, **kwargs)
+
+
 # -------------------------
 # JSON extraction / repair
 # -------------------------
+def _first_json_object(text: str) -> Optional[str]:
+    """
+    Scansione lineare con conteggio delle graffe (ignorando quelle nelle stringhe):
+    si ferma alla } che chiude il primo oggetto.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+
+    # oggetto non bilanciato (es. output troncato): fino all'ultima }
+    end = text.rfind("}")
+    return text[start:end + 1] if end > start else None
+
+
 def extract_json_safely(text: str) -> str:
     """
     Estrae il primo blocco JSON {...} e applica riparazioni MINIME:
@@ -86,13 +137,13 @@ def extract_json_safely(text: str) -> str:
     if not text:
         raise ValueError("Empty LLM output")
 
-    m = re.search(r"\{.*\}", text, flags=re.DOTALL)
-    if not m:
+    s = _first_json_object(text)
+    if s is None:
         raise ValueError("No JSON object found in LLM output")
 
-    s = m.group(0).strip()
+    s = s.strip()
     s = s.replace("\r", " ").replace("\n", " ")
-    s = re.sub(r",\s*([}\]])", r"\1", s)  # trailing commas
+    s = _RE_TRAIL_COMMA.sub(r"\1", s)  # trailing commas
     return s
 
 
@@ -118,101 +169,88 @@ class FitSuggestions(BaseModel):
 # -------------------------
 # LLM steps
 # -------------------------
-def analyze_fit_core(
-    *,
-    client: OpenAIClient,
-    system_prompt: str,
-    user_template: str,
-    cv_text: str,
-    job_text: str,
-    debug_dir: Optional[Path] = None,
-) -> FitCore:
-    user_prompt = user_template.format(cv_text=cv_text, job_text=job_text)
-
-    if debug_dir:
-        debug_dir.mkdir(parents=True, exist_ok=True)
-        write_text(debug_dir / "fit_core_system.txt", system_prompt)
-        write_text(debug_dir / "fit_core_user_prompt.txt", user_prompt)
+def _save_prompts(debug_dir: Path, prefix: str, system_prompt: str, user_prompt: str) -> None:
+    write_text(debug_dir / f"{prefix}_system.txt", system_prompt)
+    write_text(debug_dir / f"{prefix}_user_prompt.txt", user_prompt)
 
-    resp = client.invoke(
-        input=user_prompt,
-        system_prompt=system_prompt,
-        temperature=0.0,
-        max_tokens=3000,
-    )
 
-    raw = resp.text
+def _parse_llm_output(raw: str, model: type[BaseModel], prefix: str, debug_dir: Optional[Path] = None):
     if debug_dir:
-        write_text(debug_dir / "fit_core_raw.txt", raw)
+        write_text(debug_dir / f"{prefix}_raw.txt", raw)
 
     json_text = extract_json_safely(raw)
     if debug_dir:
-        write_text(debug_dir / "fit_core_json_extracted.txt", json_text)
+        write_text(debug_dir / f"{prefix}_json_extracted.txt", json_text)
 
     try:
-        data = json.loads(json_text)
+        data = json_loads(json_text)
     except Exception as e:
         if debug_dir:
-            write_text(debug_dir / "fit_core_parse_error.txt", str(e))
+            write_text(debug_dir / f"{prefix}_parse_error.txt", str(e))
         raise
 
     try:
-        return FitCore.model_validate(data)
+        return model.model_validate(data)
     except Exception as e:
         if debug_dir:
-            write_text(debug_dir / "fit_core_validation_error.txt", str(e))
+            write_text(debug_dir / f"{prefix}_validation_error.txt", str(e))
         raise
 
 
-def analyze_fit_suggestions(
+# Parsing e file di debug girano in un thread: l'event loop resta libero
+async def analyze_fit_core(
     *,
     client: OpenAIClient,
     system_prompt: str,
-    user_template: str,
+    user_template: Callable[..., str],
+    cv_text: str,
+    job_text: str,
+    debug_dir: Optional[Path] = None,
+) -> FitCore:
+    user_prompt = user_template(cv_text=cv_text, job_text=job_text)
+
+    if debug_dir:
+        await asyncio.to_thread(_save_prompts, debug_dir, "fit_core", system_prompt, user_prompt)
+
+    resp = await invoke_llm(
+        client,
+        input=user_prompt,
+        system_prompt=system_prompt,
+        temperature=0.0,
+        max_tokens=3000,
+    )
+
+    return await asyncio.to_thread(_parse_llm_output, resp.text, FitCore, "fit_core", debug_dir)
+
+
+async def analyze_fit_suggestions(
+    *,
+    client: OpenAIClient,
+    system_prompt: str,
+    user_template: Callable[..., str],
     cv_text: str,
     job_text: str,
     fit_core: FitCore,
     debug_dir: Optional[Path] = None,
 ) -> FitSuggestions:
-    user_prompt = user_template.format(
+    user_prompt = user_template(
         cv_text=cv_text,
         job_text=job_text,
-        fit_core_json=json_pretty(fit_core.model_dump()),
+        fit_core_json=json_pretty(fit_core.model_dump(mode="json")),
     )
 
     if debug_dir:
-        debug_dir.mkdir(parents=True, exist_ok=True)
-        write_text(debug_dir / "fit_suggestions_system.txt", system_prompt)
-        write_text(debug_dir / "fit_suggestions_user_prompt.txt", user_prompt)
+        await asyncio.to_thread(_save_prompts, debug_dir, "fit_suggestions", system_prompt, user_prompt)
 
-    resp = client.invoke(
+    resp = await invoke_llm(
+        client,
         input=user_prompt,
         system_prompt=system_prompt,
         temperature=0.0,
         max_tokens=3000,
     )
 
-    raw = resp.text
-    if debug_dir:
-        write_text(debug_dir / "fit_suggestions_raw.txt", raw)
-
-    json_text = extract_json_safely(raw)
-    if debug_dir:
-        write_text(debug_dir / "fit_suggestions_json_extracted.txt", json_text)
-
-    try:
-        data = json.loads(json_text)
-    except Exception as e:
-        if debug_dir:
-            write_text(debug_dir / "fit_suggestions_parse_error.txt", str(e))
-        raise
-
-    try:
-        return FitSuggestions.model_validate(data)
-    except Exception as e:
-        if debug_dir:
-            write_text(debug_dir / "fit_suggestions_validation_error.txt", str(e))
-        raise
+    return await asyncio.to_thread(_parse_llm_output, resp.text, FitSuggestions, "fit_suggestions", debug_dir)
 
 def compute_fit_score(
     must_have: list[MatchItem],
@@ -241,37 +279,76 @@ def compute_fit_score(
 # -------------------------
 # Pipeline
 # -------------------------
-def process_job(
+def _prepare_inputs(app_root: Path, job_id: str, cv_txt: str, job_txt: str) -> tuple[Path, str, str]:
+    llm_debug_dir = ensure_dir(job_dir(app_root, job_id) / "llm")
+    return llm_debug_dir, normalize_spaced_text(cv_txt), normalize_spaced_text(job_txt)
+
+
+def _write_outputs(
+    app_root: Path,
+    job_id: str,
+    final_report: FitReport,
+    job_title: str,
+    template_text: str,
+) -> dict:
+    out = out_dir(app_root, job_id)
+    json_path = out / "fit_report.json"
+    write_text(json_path, json_pretty_bytes(final_report.model_dump(mode="json")))
+
+    html = render_report_html(
+        final_report,
+        json_path=str(json_path),
+        job_title=job_title,
+        template_text=template_text,
+    )
+    html_path = out / "report.html"
+    write_text(html_path, html)
+
+    return {"json_path": str(json_path), "html_path": str(html_path)}
+
+
+async def process_job(
     *,
     app_root: Path,
     templates_dir: Path,
     job_id: str,
     system_prompt_core: str,
-    user_template_core: str,
+    user_template_core: Callable[..., str],
     system_prompt_sugg: str,
-    user_template_sugg: str,
+    user_template_sugg: Callable[..., str],
     cv_txt: str,
     job_txt: str,
     job_title: str = "",
+    template_text: Optional[str] = None,
 ) -> dict:
     client = build_client()
 
-    # Debug folder for LLM artifacts
-    llm_debug_dir = ensure_dir(job_dir(app_root, job_id) / "llm")
+    # Debug folder + normalize inputs ONCE, before any LLM call (in un thread)
+    llm_debug_dir, cv_txt, job_txt = await asyncio.to_thread(
+        _prepare_inputs, app_root, job_id, cv_txt, job_txt
+    )
 
-    # Normalize inputs ONCE, before any LLM call
-    cv_txt = normalize_spaced_text(cv_txt)
-    job_txt = normalize_spaced_text(job_txt)
+    # Template HTML: se non passato, letto in parallelo alle chiamate LLM
+    template_task = None
+    if template_text is None:
+        template_task = asyncio.create_task(
+            asyncio.to_thread(load_template_text, templates_dir / "report.html")
+        )
 
     # Step 1: core fit (critical)
-    fit_core = analyze_fit_core(
-        client=client,
-        system_prompt=system_prompt_core,
-        user_template=user_template_core,
-        cv_text=cv_txt,
-        job_text=job_txt,
-        debug_dir=llm_debug_dir,
-    )
+    try:
+        fit_core = await analyze_fit_core(
+            client=client,
+            system_prompt=system_prompt_core,
+            user_template=user_template_core,
+            cv_text=cv_txt,
+            job_text=job_txt,
+            debug_dir=llm_debug_dir,
+        )
+    except Exception:
+        if template_task is not None:
+            template_task.cancel()
+        raise
 
     computed_score = compute_fit_score(
         fit_core.must_have_match,
@@ -280,7 +357,7 @@ def process_job(
 
     # Step 2: suggestions (non critical)
     try:
-        suggestions = analyze_fit_suggestions(
+        suggestions = await analyze_fit_suggestions(
             client=client,
             system_prompt=system_prompt_sugg,
             user_template=user_template_sugg,
@@ -290,7 +367,7 @@ def process_job(
             debug_dir=llm_debug_dir,
         )
     except Exception as e:
-        write_text(llm_debug_dir / "fit_suggestions_error.txt", str(e))
+        await asyncio.to_thread(write_text, llm_debug_dir / "fit_suggestions_error.txt", str(e))
         suggestions = FitSuggestions()  # defaults vuoti
 
     # Merge into final FitReport
@@ -307,18 +384,10 @@ def process_job(
         final_note=suggestions.final_note,
     )
 
-    # Output
-    out = out_dir(app_root, job_id)
-    json_path = out / "fit_report.json"
-    write_text(json_path, json_pretty(final_report.model_dump()))
+    if template_task is not None:
+        template_text = await template_task
 
-    html = render_report_html(
-        final_report,
-        json_path=str(json_path),
-        template_path=str(templates_dir / "report.html"),
-        job_title=job_title,
+    # Output: serializzazione, render e scrittura in un thread
+    return await asyncio.to_thread(
+        _write_outputs, app_root, job_id, final_report, job_title, template_text
     )
-    html_path = out / "report.html"
-    write_text(html_path, html)
-
-    return {"json_path": str(json_path), "html_path": str(html_path)}
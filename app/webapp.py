@@ -1,145 +1,143 @@
 # webapp.py
 from __future__ import annotations
 
-from pathlib import Path
+import asyncio
+from contextlib import asynccontextmanager
+from typing import BinaryIO, Optional
 
 from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks
 from fastapi.requests import Request
 from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, FileResponse
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:  # fallback: stdlib json
+    DefaultJSONResponse = JSONResponse
 from fastapi.templating import Jinja2Templates
 
 from app.utility import (
-    pdf_bytes_to_text,
+    pdf_stream_to_text,
+    text_stream_to_text,
     sanitize_whitespace,
+    build_http_client,
     fetch_html,
     looks_like_authwall,
+    parse_html,
     extract_job_text_from_linkedin_html,
     extract_linkedin_job_title,
 )
+from app import job_store
+from app.job_store import set_status, get_status
+from app.jobs import PROJECT_ROOT, TEMPLATES_DIR, run_job
 from app.web_helpers import (
     new_job_id,
     save_text_input,
     job_dir,
-    process_job,
 )
 
-APP_DIR = Path(__file__).resolve().parent
-PROJECT_ROOT = APP_DIR.parent
-
-TEMPLATES_DIR = APP_DIR / "templates"
-PROMPTS_DIR = APP_DIR / "prompts"
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # client HTTP condiviso: riusa le connessioni TCP/TLS tra le richieste
+    app.state.http = build_http_client()
 
-# MVP: stato in memoria (poi DB/Redis)
-JOB_STATUS: dict[str, dict] = {}
+    # con Redis i job vanno in coda (worker arq), altrimenti BackgroundTasks
+    app.state.queue = None
+    if job_store.REDIS_URL:
+        from arq import create_pool
+        from arq.connections import RedisSettings
 
+        app.state.queue = await create_pool(RedisSettings.from_dsn(job_store.REDIS_URL))
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+        if app.state.queue is not None:
+            await app.state.queue.aclose()
+        await job_store.close()
 
-def load_prompt_md(filename: str) -> str:
-    path = PROMPTS_DIR / filename
-    if not path.exists():
-        raise FileNotFoundError(f"Prompt file missing: {path}")
-    return path.read_text(encoding="utf-8").strip()
 
+app = FastAPI(default_response_class=DefaultJSONResponse, lifespan=lifespan)
 
-SYSTEM_PROMPT_CORE = load_prompt_md("hr_fit_core_system.md")
-USER_TEMPLATE_CORE = load_prompt_md("hr_fit_core_user.md")
 
-SYSTEM_PROMPT_SUGG = load_prompt_md("hr_fit_suggestions_system.md")
-USER_TEMPLATE_SUGG = load_prompt_md("hr_fit_suggestions_user.md")
+@app.get("/", response_class=HTMLResponse)
+def page_upload(request: Request):
+    return templates.TemplateResponse("upload.html", {"request": request})
 
 
-def set_status(job_id: str, status: str, error: str | None = None, **extra) -> None:
-    JOB_STATUS[job_id] = {"status": status, "error": error, **extra}
+# Parti sincrone (disco + CPU) di /upload: girano in un thread, non sull'event loop
+def _read_cv(job_id: str, filename: str, stream: BinaryIO) -> Optional[str]:
+    if filename.lower().endswith(".pdf"):
+        cv_txt = pdf_stream_to_text(stream)
+    else:
+        cv_txt = text_stream_to_text(stream)
 
+    if cv_txt is not None:
+        save_text_input(PROJECT_ROOT, job_id, "cv.txt", cv_txt)
+    return cv_txt
 
-def run_job(job_id: str, cv_txt: str, job_txt: str, job_title: str) -> None:
-    try:
-        set_status(job_id, "RUNNING")
-
-        paths = process_job(
-            app_root=PROJECT_ROOT,
-            templates_dir=TEMPLATES_DIR,
-            job_id=job_id,
-            system_prompt_core=SYSTEM_PROMPT_CORE,
-            user_template_core=USER_TEMPLATE_CORE,
-            system_prompt_sugg=SYSTEM_PROMPT_SUGG,
-            user_template_sugg=USER_TEMPLATE_SUGG,
-            cv_txt=cv_txt,
-            job_txt=job_txt,
-            job_title=job_title,
-        )
-
-        set_status(job_id, "DONE", None, **paths)
-    except Exception as e:
-        # salva sempre l'errore su disco, così non lo perdi
-        try:
-            save_text_input(PROJECT_ROOT, job_id, "error.txt", str(e))
-        except Exception:
-            pass
-        set_status(job_id, "ERROR", str(e))
 
+def _read_job_page(job_id: str, html: str) -> Optional[tuple[str, str]]:
+    # salva raw html per debug
+    save_text_input(PROJECT_ROOT, job_id, "linkedin_job_raw.html", html)
 
-@app.get("/", response_class=HTMLResponse)
-def page_upload(request: Request):
-    return templates.TemplateResponse("upload.html", {"request": request})
+    # authwall check
+    if looks_like_authwall(html):
+        return None
+
+    # parse job title + job text (una sola parse)
+    soup = parse_html(html)
+    job_title = extract_linkedin_job_title(soup)
+    job_txt = sanitize_whitespace(extract_job_text_from_linkedin_html(soup))
+    return job_title, job_txt
 
 
 @app.post("/upload")
-def upload(
+async def upload(
+    request: Request,
     background_tasks: BackgroundTasks,
     cv: UploadFile = File(...),
     job_url: str = Form(...),
 ):
     job_id = new_job_id()
-    set_status(job_id, "UPLOADED")
+    await set_status(job_id, "UPLOADED")
 
-    # ---- CV -> text
-    cv_bytes = cv.file.read() or b""
-    if not cv_bytes:
-        set_status(job_id, "ERROR", "File CV vuoto o non leggibile.")
+    # ---- CV -> text (streaming, senza caricare il file in memoria)
+    cv_txt = await asyncio.to_thread(_read_cv, job_id, cv.filename or "", cv.file)
+    if cv_txt is None:
+        await set_status(job_id, "ERROR", "File CV vuoto o non leggibile.")
         return RedirectResponse(url=f"/wait/{job_id}", status_code=303)
 
-    cv_name = (cv.filename or "").lower()
-    if cv_name.endswith(".pdf"):
-        cv_txt = pdf_bytes_to_text(cv_bytes)
-    else:
-        cv_txt = cv_bytes.decode("utf-8", errors="ignore")
-
-    cv_txt = sanitize_whitespace(cv_txt)
-    save_text_input(PROJECT_ROOT, job_id, "cv.txt", cv_txt)
-
     # ---- Job URL (required)
     job_url_clean = (job_url or "").strip()
     if not job_url_clean:
-        set_status(job_id, "ERROR", "URL della posizione LinkedIn mancante.")
+        await set_status(job_id, "ERROR", "URL della posizione LinkedIn mancante.")
         return RedirectResponse(url=f"/wait/{job_id}", status_code=303)
 
     # fetch HTML
     try:
-        html = fetch_html(job_url_clean)
+        html = await fetch_html(request.app.state.http, job_url_clean)
     except Exception as e:
-        save_text_input(PROJECT_ROOT, job_id, "fetch_error.txt", str(e))
-        set_status(job_id, "ERROR", "Errore nel recupero della pagina LinkedIn (fetch).")
+        await asyncio.to_thread(save_text_input, PROJECT_ROOT, job_id, "fetch_error.txt", str(e))
+        await set_status(job_id, "ERROR", "Errore nel recupero della pagina LinkedIn (fetch).")
         return RedirectResponse(url=f"/wait/{job_id}", status_code=303)
 
-    # salva raw html per debug
-    save_text_input(PROJECT_ROOT, job_id, "linkedin_job_raw.html", html)
-
-    # authwall check
-    if looks_like_authwall(html):
-        set_status(job_id, "ERROR", "LinkedIn ha restituito una pagina di login/authwall.")
+    # salvataggio, authwall check e parsing in un thread
+    job = await asyncio.to_thread(_read_job_page, job_id, html)
+    if job is None:
+        await set_status(job_id, "ERROR", "LinkedIn ha restituito una pagina di login/authwall.")
         return RedirectResponse(url=f"/wait/{job_id}", status_code=303)
-
-    # parse job title + job text
-    job_title = extract_linkedin_job_title(html)
-    job_txt = extract_job_text_from_linkedin_html(html)
-    job_txt = sanitize_whitespace(job_txt)
+    job_title, job_txt = job
 
     # ---- LLM background
-    background_tasks.add_task(run_job, job_id, cv_txt, job_txt, job_title)
+    queue = request.app.state.queue
+    if queue is not None:
+        await queue.enqueue_job("run_job", job_id, cv_txt, job_txt, job_title, _job_id=job_id)
+    else:
+        background_tasks.add_task(run_job, job_id, cv_txt, job_txt, job_title)
     return RedirectResponse(url=f"/wait/{job_id}", status_code=303)
 
 
@@ -149,16 +147,16 @@ def page_wait(request: Request, job_id: str):
 
 
 @app.get("/api/status/{job_id}")
-def api_status(job_id: str):
-    data = JOB_STATUS.get(job_id)
+async def api_status(job_id: str):
+    data = await get_status(job_id)
     if not data:
-        return JSONResponse({"status": "NOT_FOUND", "error": None}, status_code=404)
-    return JSONResponse(data)
+        return DefaultJSONResponse({"status": "NOT_FOUND", "error": None}, status_code=404)
+    return DefaultJSONResponse(data)
 
 
 @app.get("/report/{job_id}")
-def page_report(job_id: str):
-    data = JOB_STATUS.get(job_id)
+async def page_report(job_id: str):
+    data = await get_status(job_id)
     if not data:
         return RedirectResponse(url="/", status_code=303)
     if data.get("status") != "DONE":
@@ -167,23 +165,23 @@ def page_report(job_id: str):
 
 
 @app.get("/download/{job_id}/json")
-def download_json(job_id: str):
-    data = JOB_STATUS.get(job_id)
+async def download_json(job_id: str):
+    data = await get_status(job_id)
     if not data or data.get("status") != "DONE":
         return RedirectResponse(url=f"/wait/{job_id}", status_code=303)
     return FileResponse(data["json_path"], media_type="application/json", filename="fit_report.json")
 
 
 @app.get("/download/{job_id}/html")
-def download_html(job_id: str):
-    data = JOB_STATUS.get(job_id)
+async def download_html(job_id: str):
+    data = await get_status(job_id)
     if not data or data.get("status") != "DONE":
         return RedirectResponse(url=f"/wait/{job_id}", status_code=303)
     return FileResponse(data["html_path"], media_type="text/html", filename="report.html")
 
 @app.get("/error/{job_id}", response_class=HTMLResponse)
-def page_error(request: Request, job_id: str):
-    data = JOB_STATUS.get(job_id, {})
+async def page_error(request: Request, job_id: str):
+    data = await get_status(job_id) or {}
     error_msg = data.get("error") or "An unexpected error occurred during the analysis."
 
     return templates.TemplateResponse(
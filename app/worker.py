@@ -0,0 +1,38 @@
+# worker.py
+# Avvio: arq app.worker.WorkerSettings (richiede REDIS_URL)
+from __future__ import annotations
+
+import asyncio
+
+from arq.connections import RedisSettings
+
+from app import job_store
+from app.job_store import set_status
+from app.jobs import run_job as _run_job
+
+if not job_store.REDIS_URL:
+    # senza Redis lo stato resterebbe nella memoria del worker, invisibile al web
+    raise RuntimeError("Missing REDIS_URL in environment: the arq worker requires Redis.")
+
+
+async def run_job(ctx: dict, job_id: str, cv_txt: str, job_txt: str, job_title: str) -> None:
+    try:
+        await _run_job(job_id, cv_txt, job_txt, job_title)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        # job_timeout di arq cancella il job: CancelledError salta l'except di run_job,
+        # quindi segna l'errore qui, altrimenti lo stato resta RUNNING
+        await set_status(job_id, "ERROR", "Analisi scaduta (timeout).")
+        raise
+
+
+async def shutdown(ctx: dict) -> None:
+    await job_store.close()
+
+
+class WorkerSettings:
+    functions = [run_job]
+    on_shutdown = shutdown
+    redis_settings = RedisSettings.from_dsn(job_store.REDIS_URL)
+    max_jobs = 10
+    job_timeout = 600
+    keep_result = 0